@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fuelstation',
+            index=models.Index(fields=['latitude', 'longitude'], name='planner_fue_latitud_0f59b8_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0002_latitude_longitude_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='fuelstation',
+            name='planner_fue_latitud_0f59b8_idx',
+        ),
+        migrations.AddIndex(
+            model_name='fuelstation',
+            index=models.Index(fields=['geocoded', 'latitude', 'longitude'], name='planner_fue_geocode_784e97_idx'),
+        ),
+    ]
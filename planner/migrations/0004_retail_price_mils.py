@@ -0,0 +1,45 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_price_to_mils(apps, schema_editor):
+    FuelStation = apps.get_model('planner', 'FuelStation')
+    FuelStation.objects.update(retail_price_mils=F('retail_price') * 1000)
+
+
+def copy_mils_to_price(apps, schema_editor):
+    FuelStation = apps.get_model('planner', 'FuelStation')
+    FuelStation.objects.update(retail_price=F('retail_price_mils') / 1000.0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0003_geocoded_latitude_longitude_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fuelstation',
+            name='retail_price_mils',
+            field=models.IntegerField(default=0, help_text='Retail price per gallon in mils (0.001 USD)'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_price_to_mils, copy_mils_to_price),
+        migrations.RemoveIndex(
+            model_name='fuelstation',
+            name='planner_fue_state_caedfb_idx',
+        ),
+        migrations.RemoveField(
+            model_name='fuelstation',
+            name='retail_price',
+        ),
+        migrations.AlterModelOptions(
+            name='fuelstation',
+            options={'ordering': ['retail_price_mils']},
+        ),
+        migrations.AddIndex(
+            model_name='fuelstation',
+            index=models.Index(fields=['state', 'retail_price_mils'], name='planner_fue_state_d878cb_idx'),
+        ),
+    ]
@@ -9,7 +9,9 @@ class FuelStation(models.Model):
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=2)
     rack_id = models.IntegerField(help_text="Rack ID")
-    retail_price = models.DecimalField(max_digits=6, decimal_places=3, help_text="Retail price per gallon")
+    # Stored in mils (0.001 USD) so ordering/arithmetic stay native ints
+    # instead of going through Decimal
+    retail_price_mils = models.IntegerField(help_text="Retail price per gallon in mils (0.001 USD)")
     
     # Location fields - will be populated by geocoding
     latitude = models.FloatField(null=True, blank=True)
@@ -21,11 +23,17 @@ class FuelStation(models.Model):
     geocoded = models.BooleanField(default=False, help_text="Whether this station has been geocoded")
     
     class Meta:
-        ordering = ['retail_price']
+        ordering = ['retail_price_mils']
         indexes = [
-            models.Index(fields=['state', 'retail_price']),
+            models.Index(fields=['state', 'retail_price_mils']),
             models.Index(fields=['geocoded']),
+            models.Index(fields=['geocoded', 'latitude', 'longitude']),
         ]
     
+    @property
+    def retail_price(self) -> float:
+        """Retail price per gallon in dollars"""
+        return self.retail_price_mils / 1000
+
     def __str__(self):
         return f"{self.name} - {self.city}, {self.state} - ${self.retail_price}"
@@ -4,7 +4,9 @@ from .models import FuelStation
 
 class FuelStationSerializer(serializers.ModelSerializer):
     """Serializer for fuel station data in API responses"""
-    
+    # Dollar price computed from the stored integer mils
+    retail_price = serializers.ReadOnlyField()
+
     class Meta:
         model = FuelStation
         fields = [
@@ -1,17 +1,72 @@
+import asyncio
 import logging
+import threading
 from typing import Optional, Dict, Any
+import httpx
 from django.core.cache import cache
 from django.conf import settings
+from tenacity import (
+    AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class BaseService:
     """Base service class with common functionality"""
-    
+
     def __init__(self):
         self.cache_ttl = getattr(settings, 'CACHE_TTL', 3600)
-    
+        # One client per event loop, guarded by a lock: services are shared
+        # module-level singletons, and an unsynchronized single-slot client
+        # could hand one thread a client bound to another thread's loop
+        self._http_clients = {}
+        self._http_clients_lock = threading.Lock()
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """
+        Shared HTTP client with keep-alive, created lazily per event loop.
+
+        Reusing one client avoids a fresh TCP/TLS handshake per request;
+        pooled connections don't survive across loops, so each running loop
+        gets its own client. Entries for loops that have finished are
+        dropped on the way - their transports died with the loop, so
+        there is nothing left to aclose().
+        """
+        loop = asyncio.get_event_loop()
+        with self._http_clients_lock:
+            client = self._http_clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_keepalive_connections=32, max_connections=32)
+                )
+                self._http_clients[loop] = client
+                for stale in [l for l in self._http_clients if l.is_closed()]:
+                    del self._http_clients[stale]
+        return client
+
+    def http_retrying(self) -> AsyncRetrying:
+        """
+        Retry policy for upstream HTTP calls: exponential backoff (1-30s),
+        up to 5 attempts, retrying only transient failures (HTTP errors and
+        timeouts). The final failure is re-raised to the caller.
+        """
+        return AsyncRetrying(
+            wait=wait_exponential(multiplier=1, min=1, max=30),
+            stop=stop_after_attempt(5),
+            retry=retry_if_exception_type((httpx.HTTPStatusError, httpx.TimeoutException)),
+            reraise=True,
+        )
+
+    async def close_http_client(self):
+        """Close the current loop's shared HTTP client and its pooled connections"""
+        loop = asyncio.get_running_loop()
+        with self._http_clients_lock:
+            client = self._http_clients.pop(loop, None)
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
     def get_from_cache(self, cache_key: str) -> Optional[Any]:
         """Get data from cache"""
         try:
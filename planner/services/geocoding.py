@@ -1,7 +1,11 @@
 import asyncio
+import hashlib
 import httpx
 import logging
+import orjson
+import unicodedata
 from typing import List, Tuple, Optional
+import diskcache
 from django.conf import settings
 from django.core.cache import cache
 from asgiref.sync import sync_to_async
@@ -19,11 +23,30 @@ class GeocodingService(BaseService):
         self.base_url = settings.NOMINATIM_BASE_URL
         self.user_agent = settings.NOMINATIM_USER_AGENT
         self.rate_limit_delay = 1.1  # Slightly more than 1 second for rate limiting
-        
-    async def geocode_address(self, address: str, city: str, state: str) -> Optional[Tuple[float, float]]:
+        self.max_concurrency = 8  # Requests allowed in flight at once
+        # Second-tier cache that survives restarts, so redeploys and dev
+        # runs don't re-hit Nominatim for addresses we've already resolved
+        self.disk_cache = diskcache.Cache(settings.GEOCODE_CACHE_DIR)
+        self.disk_cache_ttl = 30 * 86400  # 30 days
+        # Loop timestamp before which no request token may be released;
+        # advanced when the server sends Retry-After
+        self._backoff_until = 0.0
+
+    @staticmethod
+    def _disk_cache_key(address: str, city: str, state: str) -> str:
+        """Hash a normalized (address, city, state) query into a fixed-size key"""
+        normalized = unicodedata.normalize('NFKD', f"{address}|{city}|{state}").lower().strip()
+        return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+    async def geocode_address(self, address: str, city: str, state: str,
+                              token_bucket: Optional[asyncio.Queue] = None) -> Optional[Tuple[float, float]]:
         """
         Geocode an address using Nominatim with caching
         Returns (latitude, longitude) or None if geocoding fails
+
+        When token_bucket is given, a rate-limit token is consumed only
+        after both cache tiers miss, so reruns over already-resolved
+        addresses don't wait out the Nominatim request budget
         """
         # Create cache key
         cache_key = f"geocode:{address}:{city}:{state}".replace(" ", "_").lower()
@@ -32,78 +55,147 @@ class GeocodingService(BaseService):
         cached_result = self.get_from_cache(cache_key)
         if cached_result:
             return cached_result
-        
+
+        # Then the persistent on-disk cache
+        disk_key = self._disk_cache_key(address, city, state)
+        disk_result = self.disk_cache.get(disk_key)
+        if disk_result:
+            self.set_cache(cache_key, disk_result, 86400)
+            return disk_result
+
         # Build query string
         query = f"{address}, {city}, {state}, USA"
-        
+
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/search",
-                    params={
-                        'q': query,
-                        'format': 'json',
-                        'limit': 1,
-                        'countrycodes': 'us'
-                    },
-                    headers={'User-Agent': self.user_agent},
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                if data and len(data) > 0:
-                    lat = float(data[0]['lat'])
-                    lon = float(data[0]['lon'])
-                    result = (lat, lon)
-                    
-                    # Cache the result for 24 hours
-                    self.set_cache(cache_key, result, 86400)
-                    return result
-                    
+            # Both caches missed - a Nominatim request is now unavoidable,
+            # so this is the point to wait for a rate-limit token
+            if token_bucket is not None:
+                await token_bucket.get()
+            async for attempt in self.http_retrying():
+                with attempt:
+                    response = await self._request_geocode(query)
+
+            data = orjson.loads(response.content)
+            if data and len(data) > 0:
+                lat = float(data[0]['lat'])
+                lon = float(data[0]['lon'])
+                result = (lat, lon)
+
+                # Cache the result for 24 hours, and on disk for 30 days
+                self.set_cache(cache_key, result, 86400)
+                self.disk_cache.set(disk_key, result, expire=self.disk_cache_ttl)
+                return result
+
+        except httpx.HTTPError:
+            # Transient upstream failure that survived the retry policy:
+            # propagate for the caller to decide - the view answers 503,
+            # the bulk geocoder logs and skips the station
+            raise
         except Exception as e:
             self.log_error(f"Geocoding error for {query}", e)
-            
+
         return None
-    
+
+    async def _request_geocode(self, query: str) -> httpx.Response:
+        """
+        Issue one Nominatim search request. On 429, push the server's
+        Retry-After into the token bucket before the retry policy re-raises.
+        """
+        response = await self.http_client.get(
+            f"{self.base_url}/search",
+            params={
+                'q': query,
+                'format': 'json',
+                'limit': 1,
+                'countrycodes': 'us'
+            },
+            headers={'User-Agent': self.user_agent},
+            timeout=10.0
+        )
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError:
+            if response.status_code == 429:
+                retry_after = response.headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    self._backoff_until = (
+                        asyncio.get_event_loop().time() + int(retry_after)
+                    )
+            raise
+        return response
+
     async def geocode_fuel_stations(self, stations: List[FuelStation]) -> List[FuelStation]:
         """
-        Geocode multiple fuel stations with rate limiting
+        Geocode multiple fuel stations concurrently with rate limiting
         Only geocodes stations that haven't been geocoded yet
         """
         stations_to_geocode = [s for s in stations if not s.geocoded]
-        
+
         if not stations_to_geocode:
             return stations
-            
-        geocoded_stations = []
-        
-        for i, station in enumerate(stations_to_geocode):
+
+        # Up to max_concurrency requests in flight, but the token bucket
+        # still releases only one request per rate_limit_delay seconds so
+        # Nominatim's 1 req/s policy is respected globally
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        token_bucket = asyncio.Queue(maxsize=1)
+        token_task = asyncio.ensure_future(self._release_tokens(token_bucket))
+
+        try:
+            geocoded_stations = await asyncio.gather(*[
+                self._geocode_one(station, semaphore, token_bucket)
+                for station in stations_to_geocode
+            ])
+        finally:
+            token_task.cancel()
+
+        # Persist all newly geocoded stations in one bulk_update instead of
+        # an UPDATE round-trip per station
+        to_persist = [s for s in geocoded_stations if s.geocoded]
+        if to_persist:
+            await sync_to_async(FuelStation.objects.bulk_update)(
+                to_persist, ['latitude', 'longitude', 'geocoded'], batch_size=500
+            )
+
+        return list(geocoded_stations)
+
+    async def _release_tokens(self, token_bucket: asyncio.Queue):
+        """
+        Release one request token every rate_limit_delay seconds, holding
+        tokens back while a server-requested backoff window is open
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            wait = self._backoff_until - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await token_bucket.put(None)
+            await asyncio.sleep(self.rate_limit_delay)
+
+    async def _geocode_one(self, station: FuelStation, semaphore: asyncio.Semaphore,
+                           token_bucket: asyncio.Queue) -> FuelStation:
+        """
+        Geocode a single station; the token wait happens inside
+        geocode_address only if the address isn't already cached
+        """
+        async with semaphore:
             try:
                 coords = await self.geocode_address(
-                    station.address, 
-                    station.city, 
-                    station.state
+                    station.address,
+                    station.city,
+                    station.state,
+                    token_bucket=token_bucket
                 )
-                
+
                 if coords:
                     station.latitude = coords[0]
                     station.longitude = coords[1]
                     station.geocoded = True
-                    await sync_to_async(station.save)()
-                    geocoded_stations.append(station)
-                else:
-                    geocoded_stations.append(station)
-                    
-                # Rate limiting - wait between requests
-                if i < len(stations_to_geocode) - 1:
-                    await asyncio.sleep(self.rate_limit_delay)
-                    
+
             except Exception as e:
                 self.log_error(f"Error geocoding station {station.name}", e)
-                geocoded_stations.append(station)
-        
-        return geocoded_stations
+
+        return station
     
     def geocode_sync(self, address: str, city: str, state: str) -> Optional[Tuple[float, float]]:
         """
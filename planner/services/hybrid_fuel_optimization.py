@@ -1,47 +1,259 @@
 """
 Hybrid fuel optimization service that uses real fuel station data with smart location filtering
 """
-import asyncio
 import math
 import logging
+import threading
+import time
+from collections import defaultdict, namedtuple
 from typing import List, Dict, Tuple, Optional
+import numpy as np
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from planner.models import FuelStation
 from .base import BaseService
 from .geocoding import GeocodingService
-from asgiref.sync import sync_to_async
 
 logger = logging.getLogger(__name__)
 
+# Lightweight station record for fuel stops; defined once at import time so
+# the optimization loop doesn't build a throwaway class per stop
+Station = namedtuple('Station', [
+    'name', 'address', 'city', 'state', 'latitude', 'longitude', 'retail_price'
+])
+
 
 class HybridFuelOptimizationService(BaseService):
     """Hybrid fuel optimization that uses real data with smart filtering"""
-    
+
+    # Cell size for the in-process spatial grid, in degrees. One degree of
+    # latitude is ~69 miles, so one neighbouring row each way always covers
+    # max_detour_miles north-south; a degree of longitude shrinks with
+    # cos(latitude), so the east-west ring is widened per route in
+    # _corridor_station_arrays
+    GRID_CELL_DEG = 1.0
+
     def __init__(self):
         super().__init__()
         self.max_range = settings.VEHICLE_MAX_RANGE  # miles
         self.mpg = settings.VEHICLE_MPG  # miles per gallon
+        self.max_detour_miles = 50  # How far off an ideal stop a station may be
         self.geocoding_service = GeocodingService()
+        self._grid = None
+        self._grid_built_at = 0.0
+        self._grid_lock = threading.Lock()
         
-    def calculate_distance(self, point1: Tuple[float, float], point2: Tuple[float, float]) -> float:
-        """Calculate distance between two points in miles using Haversine formula"""
-        lat1, lon1 = point1
-        lat2, lon2 = point2
-        
-        # Convert to radians
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
+    @staticmethod
+    def _haversine(lat1_rad: float, lon1_rad: float, cos_lat1: float,
+                   lat2_rad: float, lon2_rad: float, cos_lat2: float) -> float:
+        """
+        Haversine on pre-converted radians, in miles.
+
+        Callers that hold a point fixed across many distances can convert it
+        (and take its cosine) once and reuse the values. The atan2 form is
+        equivalent to asin(sqrt(a)) but numerically safer near antipodes and
+        avoids one transcendental call.
+        """
+        dlat = lat2_rad - lat1_rad
+        dlon = lon2_rad - lon1_rad
+        a = math.sin(dlat/2)**2 + cos_lat1 * cos_lat2 * math.sin(dlon/2)**2
+        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
         # Radius of earth in miles
         r = 3959
         return c * r
-    
-    def interpolate_point(self, start: Tuple[float, float], end: Tuple[float, float], 
+
+    def calculate_distance(self, point1: Tuple[float, float], point2: Tuple[float, float]) -> float:
+        """Calculate distance between two points in miles using Haversine formula"""
+        lat1_rad = math.radians(point1[0])
+        lat2_rad = math.radians(point2[0])
+        return self._haversine(
+            lat1_rad, math.radians(point1[1]), math.cos(lat1_rad),
+            lat2_rad, math.radians(point2[1]), math.cos(lat2_rad)
+        )
+
+
+    def haversine_vec(self, lat0: float, lon0: float,
+                      lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """
+        Vectorized Haversine: distances in miles from one origin to arrays
+        of latitudes/longitudes, computed in a single NumPy pass
+        """
+        lat0, lon0 = math.radians(lat0), math.radians(lon0)
+        lats = np.radians(lats)
+        dlat = lats - lat0
+        dlon = np.radians(lons) - lon0
+        a = np.sin(dlat / 2)**2 + math.cos(lat0) * np.cos(lats) * np.sin(dlon / 2)**2
+        return 3959 * 2 * np.arcsin(np.sqrt(a))
+
+    @staticmethod
+    def _min_route_distances(route_points: np.ndarray,
+                             lat_arr: np.ndarray,
+                             lon_arr: np.ndarray) -> np.ndarray:
+        """
+        Distance in miles from each station to its nearest route vertex,
+        via one broadcast Haversine pass over the (stations x route points)
+        grid instead of a Python loop per pair.
+
+        Stations are processed in blocks sized so each intermediate stays
+        around a million float32 elements (~4 MB), keeping the working set
+        cache-friendly even for long routes with many candidates.
+        """
+        # route_points rows are (lon, lat); pre-convert once
+        rlat = np.radians(route_points[:, 1], dtype=np.float32)
+        rlon = np.radians(route_points[:, 0], dtype=np.float32)
+        cos_rlat = np.cos(rlat)
+
+        slat = np.radians(lat_arr).astype(np.float32)
+        slon = np.radians(lon_arr).astype(np.float32)
+        cos_slat = np.cos(slat)
+
+        block = max(1, (1 << 20) // max(1, len(rlat)))
+        out = np.empty(len(slat), dtype=np.float32)
+        for i in range(0, len(slat), block):
+            j = i + block
+            dlat = slat[i:j, None] - rlat[None, :]
+            dlon = slon[i:j, None] - rlon[None, :]
+            a = (np.sin(dlat / 2)**2
+                 + cos_slat[i:j, None] * cos_rlat[None, :] * np.sin(dlon / 2)**2)
+            np.minimum.reduce(a, axis=1, out=out[i:j])
+        # arcsin is monotonic, so the minimum survives being taken on `a`
+        # and only the per-station minima need the transcendental calls
+        return 3959 * 2 * np.arcsin(np.sqrt(out))
+
+    @staticmethod
+    def _route_cumulative_miles(route_points: np.ndarray) -> np.ndarray:
+        """
+        Cumulative distance in miles along the route's vertices, one
+        vectorized Haversine pass over consecutive pairs. Lets callers
+        parameterize positions by distance driven rather than vertex index.
+        """
+        lat = np.radians(route_points[:, 1].astype(np.float64))
+        lon = np.radians(route_points[:, 0].astype(np.float64))
+        dlat = np.diff(lat)
+        dlon = np.diff(lon)
+        a = np.sin(dlat / 2)**2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2)**2
+        segments = 3959 * 2 * np.arcsin(np.sqrt(a))
+        return np.concatenate(([0.0], np.cumsum(segments)))
+
+    def _station_grid(self):
+        """
+        Lazily build a cell-grid spatial index over all geocoded stations:
+        (cell_lat, cell_lon) -> list of row indices into parallel NumPy
+        columns. Looking up the cells a route passes through replaces the
+        whole-trip bounding-box scan with O(cells + hits) dict lookups.
+
+        The station set only changes via management commands, so the
+        snapshot is rebuilt at most once per CACHE_TTL per process.
+        """
+        with self._grid_lock:
+            now = time.monotonic()
+            if self._grid is None or now - self._grid_built_at > settings.CACHE_TTL:
+                rows = list(
+                    FuelStation.objects.filter(geocoded=True).values(
+                        'name', 'address', 'city', 'state',
+                        'latitude', 'longitude', 'retail_price_mils'
+                    )
+                )
+                lat_arr = np.asarray([r['latitude'] for r in rows])
+                lon_arr = np.asarray([r['longitude'] for r in rows])
+                price_arr = np.asarray([r['retail_price_mils'] for r in rows]) / 1000
+                grid = defaultdict(list)
+                for i in range(len(rows)):
+                    grid[(int(lat_arr[i] // self.GRID_CELL_DEG),
+                          int(lon_arr[i] // self.GRID_CELL_DEG))].append(i)
+                self._grid = (rows, lat_arr, lon_arr, price_arr, dict(grid))
+                self._grid_built_at = now
+            return self._grid
+
+    def _corridor_station_arrays(self, route_points: np.ndarray) -> Optional[Tuple[List[Dict], np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Candidate stations for a route via the spatial grid: collect the
+        cells its vertices fall in plus the surrounding ring (covering
+        max_detour_miles), then gather only the stations indexed there.
+        Same (rows, lat_arr, lon_arr, price_arr) shape as
+        _load_station_arrays, or None when the grid has no match.
+        """
+        rows, lat_arr, lon_arr, price_arr, grid = self._station_grid()
+        if not rows:
+            return None
+
+        cell_lat = np.floor(route_points[:, 1] / self.GRID_CELL_DEG).astype(np.int64)
+        cell_lon = np.floor(route_points[:, 0] / self.GRID_CELL_DEG).astype(np.int64)
+
+        # A longitude degree spans only 69*cos(lat) miles, so at northern
+        # latitudes one neighbouring column each way falls short of the
+        # detour radius; size the east-west ring for the route's highest
+        # latitude (cosine floored to keep it bounded near the poles)
+        cos_lat = max(math.cos(math.radians(float(np.abs(route_points[:, 1]).max()))), 0.1)
+        lon_ring = math.ceil(
+            self.max_detour_miles / (69.0 * cos_lat * self.GRID_CELL_DEG)
+        )
+        hit = set()
+        for cla, clo in set(zip(cell_lat.tolist(), cell_lon.tolist())):
+            for dla in (-1, 0, 1):
+                for dlo in range(-lon_ring, lon_ring + 1):
+                    hit.update(grid.get((cla + dla, clo + dlo), ()))
+        if not hit:
+            return None
+
+        keep = np.fromiter(hit, dtype=np.int64)
+        keep.sort()
+        return (
+            [rows[i] for i in keep],
+            lat_arr[keep], lon_arr[keep], price_arr[keep],
+        )
+
+    def _load_station_arrays(self, start_coords: Tuple[float, float],
+                             end_coords: Tuple[float, float],
+                             padding: float = 0.5) -> Optional[Tuple[List[Dict], np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Load geocoded stations inside the route's bounding box (padded by
+        `padding` degrees for detours) as parallel NumPy columns for scoring.
+        The range filter runs in SQL against the (latitude, longitude) index,
+        so stations far from the corridor never reach Python. Returns
+        (rows, lat_arr, lon_arr, price_arr) or None if nothing matches.
+        """
+        lat_lo, lat_hi = sorted([start_coords[0], end_coords[0]])
+        lon_lo, lon_hi = sorted([start_coords[1], end_coords[1]])
+
+        rows = list(
+            FuelStation.objects.filter(
+                geocoded=True,
+                latitude__range=(lat_lo - padding, lat_hi + padding),
+                longitude__range=(lon_lo - padding, lon_hi + padding),
+            ).values(
+                'name', 'address', 'city', 'state',
+                'latitude', 'longitude', 'retail_price_mils'
+            )
+        )
+        if not rows:
+            return None
+
+        lat_arr = np.asarray([r['latitude'] for r in rows])
+        lon_arr = np.asarray([r['longitude'] for r in rows])
+        # Mils -> dollars; divide rather than multiply by 0.001 so values
+        # like 3679 come out exactly 3.679, matching the model property
+        price_arr = np.asarray([r['retail_price_mils'] for r in rows]) / 1000
+        return rows, lat_arr, lon_arr, price_arr
+
+    def _pick_station(self, stop_coords: Tuple[float, float],
+                      station_data: Tuple[List[Dict], np.ndarray, np.ndarray, np.ndarray]) -> Dict:
+        """
+        Score every candidate station against an ideal stop position in one
+        vectorized pass: cheapest station within max_detour_miles, falling
+        back to the nearest one when nothing is close enough.
+        """
+        rows, lat_arr, lon_arr, price_arr = station_data
+        dists = self.haversine_vec(stop_coords[0], stop_coords[1], lat_arr, lon_arr)
+        nearby = dists <= self.max_detour_miles
+        if nearby.any():
+            idx = int(np.argmin(np.where(nearby, price_arr, np.inf)))
+        else:
+            idx = int(np.argmin(dists))
+        return rows[idx]
+
+    def interpolate_point(self, start: Tuple[float, float], end: Tuple[float, float],
                          ratio: float) -> Tuple[float, float]:
         """Interpolate a point between start and end based on ratio (0.0 to 1.0)"""
         lat1, lon1 = start
@@ -52,9 +264,17 @@ class HybridFuelOptimizationService(BaseService):
         
         return (lat, lon)
     
-    def find_optimal_fuel_stops(self, start_coords: Tuple[float, float], 
-                              end_coords: Tuple[float, float]) -> Dict:
-        """Find optimal fuel stops using a hybrid approach"""
+    def find_optimal_fuel_stops(self, start_coords: Tuple[float, float],
+                              end_coords: Tuple[float, float],
+                              route_points: Optional[np.ndarray] = None) -> Dict:
+        """
+        Find optimal fuel stops using a hybrid approach
+
+        route_points, when given, is the decoded route geometry as an
+        (N, 2) array of (longitude, latitude) rows; ideal stop positions
+        are then taken from the actual route instead of the straight line
+        between the endpoints.
+        """
         total_distance = self.calculate_distance(start_coords, end_coords)
         
         # If distance is within range, no stops needed
@@ -72,36 +292,91 @@ class HybridFuelOptimizationService(BaseService):
         
         # Calculate how many stops we need
         stops_needed = math.ceil(total_distance / self.max_range) - 1
+
+        # Interpolated stops are evenly spaced on the straight line between
+        # start and end, so the leg between them is total / (stops + 1); the
+        # route is already approximated by that line, so one division
+        # replaces a Haversine per stop
+        segment_distance = total_distance / (stops_needed + 1)
         
         # Create fuel stops along the route using real fuel station data
         fuel_stops = []
         total_cost = 0.0
         current_pos = start_coords
-        
-        # Get some real fuel stations for pricing reference
-        real_stations = asyncio.run(sync_to_async(list)(
-            FuelStation.objects.all().order_by('retail_price')[:10]
-        ))
-        
-        # Use real fuel prices if available, otherwise use realistic defaults
+
+        # Load geocoded stations in the route corridor once as NumPy
+        # columns: via the spatial grid along the geometry when we have it,
+        # else the whole-trip SQL bounding box
+        if route_points is not None and len(route_points) > 1:
+            station_data = self._corridor_station_arrays(route_points)
+        else:
+            station_data = self._load_station_arrays(start_coords, end_coords)
+
+        # The grid's cell cover is still rectangles; with the
+        # actual geometry in hand, drop stations farther than max_detour
+        # from every route vertex so per-stop scoring only sees stations a
+        # driver could plausibly reach
+        if station_data and route_points is not None and len(route_points) > 1:
+            rows, lat_arr, lon_arr, price_arr = station_data
+            corridor = self._min_route_distances(
+                route_points, lat_arr, lon_arr
+            ) <= self.max_detour_miles
+            if corridor.any() and not corridor.all():
+                keep = np.flatnonzero(corridor)
+                station_data = (
+                    [rows[i] for i in keep],
+                    lat_arr[keep], lon_arr[keep], price_arr[keep],
+                )
+
+        # Parameterize stop positions by distance driven, not vertex index:
+        # simplified polylines crowd vertices where the road curves, so
+        # index fractions bunch stops in curvy regions and can stretch a
+        # leg between stops past the vehicle's range
+        cum_miles = None
+        if route_points is not None and len(route_points) > 1:
+            cum_miles = self._route_cumulative_miles(route_points)
+            if cum_miles[-1] <= 0:
+                cum_miles = None
+
+        # Pricing fallback when no station has coordinates yet
+        real_stations = list(
+            FuelStation.objects.only(
+                'name', 'address', 'city', 'state', 'retail_price_mils'
+            ).order_by('retail_price_mils')[:10]
+        )
         if real_stations:
-            base_price = float(real_stations[0].retail_price)
+            base_price = real_stations[0].retail_price_mils / 1000
             price_variation = 0.5
         else:
             base_price = 3.50
             price_variation = 0.5
-        
+
         for i in range(stops_needed):
             # Calculate position along the route
             ratio = (i + 1) / (stops_needed + 1)
-            stop_coords = self.interpolate_point(start_coords, end_coords, ratio)
-            
-            # Calculate distance from previous position
-            distance_from_prev = self.calculate_distance(current_pos, stop_coords)
-            
-            # Use real fuel price with some variation
-            if real_stations and i < len(real_stations):
-                fuel_price = float(real_stations[i].retail_price)
+            if cum_miles is not None:
+                # Vertex nearest to this fraction of the route's length
+                target = ratio * cum_miles[-1]
+                idx = int(np.searchsorted(cum_miles, target))
+                if idx > 0 and (idx == len(cum_miles)
+                                or target - cum_miles[idx - 1] < cum_miles[idx] - target):
+                    idx -= 1
+                lon, lat = route_points[idx]
+                stop_coords = (float(lat), float(lon))
+            else:
+                stop_coords = self.interpolate_point(start_coords, end_coords, ratio)
+
+            if station_data:
+                # Score all candidates in one vectorized pass
+                row = self._pick_station(stop_coords, station_data)
+                fuel_price = row['retail_price_mils'] / 1000
+                station_name = row['name']
+                station_address = row['address']
+                station_city = row['city']
+                station_state = row['state']
+                stop_coords = (row['latitude'], row['longitude'])
+            elif real_stations and i < len(real_stations):
+                fuel_price = real_stations[i].retail_price_mils / 1000
                 station_name = real_stations[i].name
                 station_address = real_stations[i].address
                 station_city = real_stations[i].city
@@ -112,29 +387,38 @@ class HybridFuelOptimizationService(BaseService):
                 station_address = f"Highway {i+1}, Exit {i+1}"
                 station_city = f"City {i+1}"
                 station_state = "ST"
-            
+
+            # Distance from the previous position: a real station or a
+            # route-geometry stop sits off the straight interpolation line,
+            # so measure it; pure interpolated stops sit on the line and the
+            # segment length is exact
+            if station_data or route_points is not None:
+                distance_from_prev = self.calculate_distance(current_pos, stop_coords)
+            else:
+                distance_from_prev = segment_distance
+
             # Calculate fuel needed and cost
             fuel_needed = distance_from_prev / self.mpg
             cost = fuel_needed * fuel_price
-            
-            # Create station object
-            station = type('Station', (), {
-                'name': station_name,
-                'address': station_address,
-                'city': station_city,
-                'state': station_state,
-                'latitude': stop_coords[0],
-                'longitude': stop_coords[1],
-                'retail_price': fuel_price
-            })()
-            
+
+            # Create station record
+            station = Station(
+                name=station_name,
+                address=station_address,
+                city=station_city,
+                state=station_state,
+                latitude=stop_coords[0],
+                longitude=stop_coords[1],
+                retail_price=fuel_price
+            )
+
             fuel_stops.append({
                 'station': station,
                 'distance_from_previous': distance_from_prev,
                 'fuel_needed': fuel_needed,
                 'cost': cost
             })
-            
+
             total_cost += cost
             current_pos = stop_coords
         
@@ -150,3 +434,14 @@ class HybridFuelOptimizationService(BaseService):
                 'number_of_stops': len(fuel_stops)
             }
         }
+
+    async def afind_optimal_fuel_stops(self, start_coords: Tuple[float, float],
+                                       end_coords: Tuple[float, float],
+                                       route_points: Optional[np.ndarray] = None) -> Dict:
+        """
+        Async wrapper for find_optimal_fuel_stops; the ORM work runs in a
+        thread so it can overlap other awaited I/O
+        """
+        return await sync_to_async(self.find_optimal_fuel_stops)(
+            start_coords, end_coords, route_points
+        )
@@ -1,7 +1,8 @@
 import asyncio
+import hashlib
 import httpx
-import json
 import logging
+import orjson
 from typing import Dict, List, Tuple, Optional
 from django.conf import settings
 from django.core.cache import cache
@@ -37,38 +38,100 @@ class RoutePlanningService(BaseService):
             return cached_result
             
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"{self.osrm_base_url}/route/v1/driving/{start_lon},{start_lat};{end_lon},{end_lat}"
-                response = await client.get(
-                    url,
-                    params={
-                        'overview': 'simplified',
-                        'geometries': 'polyline',
-                        'steps': 'false'
-                    },
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                if data.get('code') == 'Ok' and data.get('routes'):
-                    route = data['routes'][0]
-                    result = {
-                        'geometry': route['geometry'],
-                        'distance': route['distance'],  # in meters
-                        'duration': route['duration'],  # in seconds
-                        'legs': route['legs']
-                    }
-                    
-                    # Cache for 1 hour
-                    self.set_cache(cache_key, result, settings.CACHE_TTL)
-                    return result
-                    
+            url = f"{self.osrm_base_url}/route/v1/driving/{start_lon},{start_lat};{end_lon},{end_lat}"
+            async for attempt in self.http_retrying():
+                with attempt:
+                    response = await self.http_client.get(
+                        url,
+                        params={
+                            'overview': 'simplified',
+                            'geometries': 'polyline',
+                            'steps': 'false'
+                        },
+                        timeout=30.0
+                    )
+                    response.raise_for_status()
+
+            data = orjson.loads(response.content)
+            if data.get('code') == 'Ok' and data.get('routes'):
+                route = data['routes'][0]
+                result = {
+                    'geometry': route['geometry'],
+                    'distance': route['distance'],  # in meters
+                    'duration': route['duration'],  # in seconds
+                    'legs': route['legs']
+                }
+
+                # Cache for 1 hour
+                self.set_cache(cache_key, result, settings.CACHE_TTL)
+                return result
+
+
+        except httpx.HTTPError:
+            # Transient upstream failure that survived the retry policy:
+            # propagate so the view can degrade with a retryable 503
+            # instead of mistaking the outage for an unroutable request
+            raise
         except Exception as e:
             self.log_error("OSRM routing error", e)
-            
+
         return None
-    
+
+    async def get_distance_matrix(self, origin: Tuple[float, float],
+                                  stations: List[Tuple[float, float]],
+                                  destination: Tuple[float, float]) -> Optional[Dict]:
+        """
+        Get road distances/durations from origin to every station and the
+        destination in one OSRM table call instead of a route call per pair
+        Returns {'distances': [...], 'durations': [...]} in meters/seconds,
+        ordered as stations + [destination]
+
+        Not called by the optimizer yet - it scores candidates with
+        vectorized Haversine - but kept as the API surface for road-exact
+        stop scoring when that precision is needed
+        """
+        points = [origin] + list(stations) + [destination]
+        coords = ";".join(f"{lon},{lat}" for lat, lon in points)
+
+        # Create cache key (hashed - the coordinate string can be long)
+        cache_key = f"route_matrix:{hashlib.blake2b(coords.encode(), digest_size=16).hexdigest()}"
+
+        # Check cache first
+        cached_result = self.get_from_cache(cache_key)
+        if cached_result:
+            return cached_result
+
+        try:
+            url = f"{self.osrm_base_url}/table/v1/driving/{coords}"
+            async for attempt in self.http_retrying():
+                with attempt:
+                    response = await self.http_client.get(
+                        url,
+                        params={
+                            'annotations': 'distance,duration',
+                            'sources': '0',
+                            'destinations': ';'.join(str(i) for i in range(1, len(points)))
+                        },
+                        timeout=30.0
+                    )
+                    response.raise_for_status()
+
+            data = orjson.loads(response.content)
+            if data.get('code') == 'Ok' and data.get('distances'):
+                result = {
+                    'distances': data['distances'][0],  # in meters
+                    'durations': data['durations'][0]  # in seconds
+                }
+
+                # Cache for 1 hour
+                self.set_cache(cache_key, result, settings.CACHE_TTL)
+                return result
+
+        except Exception as e:
+            self.log_error("OSRM table error", e)
+
+        return None
+
     async def geocode_location(self, location: str) -> Optional[Tuple[float, float]]:
         """
         Geocode a location string to coordinates
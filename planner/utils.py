@@ -1,87 +1,81 @@
 """
 Utility functions for the planner app
 """
+import functools
 import math
-from typing import List, Tuple
+from typing import Sequence, Tuple
+import numpy as np
+import orjson
+from django.conf import settings
+from shapely.geometry import LineString
 
 
-def decode_polyline(polyline: str) -> List[Tuple[float, float]]:
+@functools.lru_cache(maxsize=2048)
+def decode_polyline(polyline: str) -> Tuple[Tuple[float, float], ...]:
     """
-    Decode a polyline string into a list of [lon, lat] coordinate pairs.
-    
+    Decode a polyline string into a tuple of [lon, lat] coordinate pairs.
+
+    Decoding is pure and the same route geometry is decoded repeatedly
+    within a session, so results are memoized; the return value is a tuple
+    so cached entries can't be mutated by callers.
+
     Args:
         polyline: The encoded polyline string
-        
+
     Returns:
-        List of (longitude, latitude) tuples
+        Tuple of (longitude, latitude) tuples
     """
     if not polyline:
-        return []
-    
-    # Index into the array
+        return ()
+
+    # Work on raw byte values: indexing bytes yields ints directly, which
+    # avoids a per-character ord() call in the hot inner loop
+    buf = polyline.encode('ascii')
+    length = len(buf)
     index = 0
     lat = 0
     lng = 0
     coordinates = []
-    
-    while index < len(polyline):
-        # Get the next coordinate
+    append = coordinates.append
+
+    while index < length:
+        # Latitude delta
         shift = 0
         result = 0
-        b = 0
-        
         while True:
-            b = ord(polyline[index]) - 63
+            b = buf[index] - 63
             index += 1
             result |= (b & 0x1f) << shift
             shift += 5
             if b < 0x20:
                 break
-        
-        # Check for negative value
-        if result & 1:
-            result = ~(result >> 1)
-        else:
-            result = result >> 1
-        
-        # Add to the coordinate
-        lat += result
-        
-        # Get the next coordinate
+        lat += ~(result >> 1) if result & 1 else result >> 1
+
+        # Longitude delta
         shift = 0
         result = 0
-        b = 0
-        
         while True:
-            b = ord(polyline[index]) - 63
+            b = buf[index] - 63
             index += 1
             result |= (b & 0x1f) << shift
             shift += 5
             if b < 0x20:
                 break
-        
-        # Check for negative value
-        if result & 1:
-            result = ~(result >> 1)
-        else:
-            result = result >> 1
-        
-        # Add to the coordinate
-        lng += result
-        
-        # Add the coordinate pair
-        coordinates.append((lng, lat))
-    
-    return coordinates
-
-
-def coordinates_to_geojson_line_string(coordinates: List[Tuple[float, float]]) -> dict:
+        lng += ~(result >> 1) if result & 1 else result >> 1
+
+        # Polyline values are scaled by 1e5 (OSRM's precision-5 encoding)
+        append((lng * 1e-5, lat * 1e-5))
+
+    return tuple(coordinates)
+
+
+def coordinates_to_geojson_line_string(coordinates: Sequence[Tuple[float, float]]) -> dict:
     """
-    Convert a list of coordinate pairs to GeoJSON LineString format.
-    
+    Convert a sequence of coordinate pairs to GeoJSON LineString format.
+
     Args:
-        coordinates: List of (longitude, latitude) tuples
-        
+        coordinates: Sequence of (longitude, latitude) tuples
+
     Returns:
         GeoJSON LineString object
     """
@@ -94,12 +88,65 @@ def coordinates_to_geojson_line_string(coordinates: List[Tuple[float, float]]) -
 def polyline_to_geojson(polyline: str) -> dict:
     """
     Convert a polyline string directly to GeoJSON LineString format.
-    
+
     Args:
         polyline: The encoded polyline string
-        
+
     Returns:
         GeoJSON LineString object
     """
     coordinates = decode_polyline(polyline)
     return coordinates_to_geojson_line_string(coordinates)
+
+
+@functools.lru_cache(maxsize=256)
+def decode_polyline_array(polyline: str) -> np.ndarray:
+    """
+    Decode a polyline into an (N, 2) float32 NumPy array of
+    (longitude, latitude) rows.
+
+    The array form feeds vectorized station scoring without per-point
+    Python objects; float32 halves the footprint and is far more precise
+    than the encoding's 1e-5 resolution. Cached per polyline alongside
+    decode_polyline.
+
+    Args:
+        polyline: The encoded polyline string
+
+    Returns:
+        (N, 2) float32 ndarray of (longitude, latitude) rows
+    """
+    return np.asarray(decode_polyline(polyline), dtype=np.float32).reshape(-1, 2)
+
+
+@functools.lru_cache(maxsize=1024)
+def polyline_to_geojson_bytes(polyline: str) -> bytes:
+    """
+    Serialize a polyline's GeoJSON LineString to JSON bytes once per
+    polyline. Repeated responses for the same route splice the cached
+    bytes into the payload (orjson.Fragment) instead of re-encoding up to
+    tens of thousands of coordinate pairs per request.
+
+    The geometry is decimated with Douglas-Peucker first
+    (ROUTE_SIMPLIFY_TOLERANCE): full-resolution OSRM vertices are far
+    denser than any map render needs.
+
+    Args:
+        polyline: The encoded polyline string
+
+    Returns:
+        UTF-8 JSON bytes of the GeoJSON LineString object
+    """
+    coordinates = decode_polyline(polyline)
+    tolerance = getattr(settings, 'ROUTE_SIMPLIFY_TOLERANCE', 0)
+    if tolerance and len(coordinates) > 2:
+        coordinates = LineString(coordinates).simplify(
+            tolerance, preserve_topology=False
+        ).coords
+    # 5 decimals ~ 1.1 m: matches the encoding's own precision and keeps
+    # float reprs short in the serialized JSON
+    coordinates = np.round(np.asarray(coordinates), 5)
+    return orjson.dumps(
+        coordinates_to_geojson_line_string(coordinates),
+        option=orjson.OPT_SERIALIZE_NUMPY
+    )
@@ -1,99 +1,350 @@
+import asyncio
+import base64
 import hashlib
 import logging
+import threading
+import cachetools
+import httpx
+import orjson
+import zstandard
+from asgiref.sync import sync_to_async
 from django.core.cache import cache
 from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from .serializers import RouteRequestSerializer, RouteResponseSerializer
 from .services.routing import RoutePlanningService
 from .services.hybrid_fuel_optimization import HybridFuelOptimizationService
 from .services.geocoding import GeocodingService
-from .utils import polyline_to_geojson
+from .utils import decode_polyline_array, polyline_to_geojson_bytes
 
 logger = logging.getLogger(__name__)
 
+# Services are stateless between requests; construct them once and share
+# across requests instead of rebuilding (and re-pooling HTTP connections)
+# on every cache miss
+_services_lock = threading.Lock()
+_routing_service = None
+_fuel_service = None
+
+# Process-local tier in front of Redis: traffic concentrates on a handful
+# of popular routes, and serving their (small, compressed) bodies from
+# memory skips the Redis roundtrip entirely. TTL matches the backend cache
+# so the two tiers expire together; TTLCache is not thread-safe, hence the
+# lock around every access
+_local_cache = cachetools.TTLCache(maxsize=1024, ttl=settings.CACHE_TTL)
+_local_cache_lock = threading.Lock()
+
+
+def _validate_route_request(data):
+    """
+    Validate a route-plan request body without building a DRF serializer.
+
+    Enforces the same rules as RouteRequestSerializer (required non-blank
+    string, max 255 chars, stripped), but as two plain checks instead of
+    per-request field binding - the serializer machinery was the largest
+    constant cost on cache hits.
+
+    Returns (start, finish, errors) where errors is None when valid.
+    """
+    errors = {}
+    values = {}
+    for field in ('start', 'finish'):
+        value = data.get(field) if hasattr(data, 'get') else None
+        if not isinstance(value, str) or not value.strip():
+            errors[field] = [f'{field.capitalize()} location cannot be empty']
+        elif len(value) > 255:
+            errors[field] = ['Ensure this field has no more than 255 characters.']
+        else:
+            values[field] = value.strip()
+    if errors:
+        return None, None, errors
+    return values['start'], values['finish'], None
+
+
+def _get_services():
+    """Lazily build the shared routing and fuel-optimization services"""
+    global _routing_service, _fuel_service
+    if _routing_service is None:
+        with _services_lock:
+            if _routing_service is None:
+                _fuel_service = HybridFuelOptimizationService()
+                _routing_service = RoutePlanningService()
+    return _routing_service, _fuel_service
+
+
+# One persistent event loop on a dedicated thread serves every request:
+# a per-request asyncio.run would give each request a fresh loop, forcing
+# the services to rebuild their HTTP clients (new TCP/TLS pool, stranded
+# old client) on every cache miss
+_plan_loop = None
+_plan_loop_lock = threading.Lock()
+
+
+def _get_plan_loop():
+    """Lazily start the shared event loop that runs plan coroutines"""
+    global _plan_loop
+    if _plan_loop is None:
+        with _plan_loop_lock:
+            if _plan_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name='route-plan-loop', daemon=True
+                ).start()
+                _plan_loop = loop
+    return _plan_loop
+
 
 class RoutePlanView(APIView):
     """
     API endpoint for route planning with optimal fuel stops
     """
     permission_classes = [AllowAny]
-    
+
+    @staticmethod
+    async def _plan(routing_service, fuel_service, start, finish,
+                    variant_key, key_suffix=''):
+        """
+        Run the plan's I/O-bound legs on one event loop: geocode both
+        endpoints concurrently, then fetch the OSRM route and optimize fuel
+        stops along its geometry. DRF's APIView dispatch is sync, so the
+        orchestration lives here and post() submits it to the shared
+        event-loop thread on every local-cache miss.
+
+        Geocoding is served from its own persistent caches most of the
+        time, so it runs first and both response keys (text + coord) are
+        then probed in a single cache.get_many roundtrip instead of two
+        sequential gets.
+
+        Returns a dict with either 'cached'/'from_text' (cache hit) or
+        'start_coords'/'end_coords'/'route'/'fuel_optimization'/'coord_key'.
+        """
+        start_coords, end_coords = await asyncio.gather(
+            routing_service.geocode_location(start),
+            routing_service.geocode_location(finish),
+        )
+        if not start_coords or not end_coords:
+            return {}
+
+        # Different texts can geocode to the same place; a second cache
+        # keyed on coordinates quantized to 4 decimals (~11 m) lets a
+        # text-key miss still skip the route fetch and fuel optimization
+        coord_key = (
+            f"route_plan_coords:{round(start_coords[0], 4)},{round(start_coords[1], 4)}"
+            f"|{round(end_coords[0], 4)},{round(end_coords[1], 4)}{key_suffix}"
+        )
+        hits = await sync_to_async(cache.get_many)([variant_key, coord_key])
+        cached_result = hits.get(variant_key)
+        if cached_result:
+            return {'cached': cached_result, 'coord_key': coord_key, 'from_text': True}
+        cached_result = hits.get(coord_key)
+        if cached_result:
+            return {'cached': cached_result, 'coord_key': coord_key, 'from_text': False}
+
+        route = await routing_service.get_route(start_coords, end_coords)
+        if not route:
+            return {}
+
+        # Feed the decoded geometry (float32 SoA) to the optimizer so fuel
+        # stops follow the actual route rather than the straight line
+        fuel_optimization = await fuel_service.afind_optimal_fuel_stops(
+            start_coords, end_coords, decode_polyline_array(route['geometry'])
+        )
+
+        return {
+            'cached': None,
+            'start_coords': start_coords,
+            'end_coords': end_coords,
+            'route': route,
+            'fuel_optimization': fuel_optimization,
+            'coord_key': coord_key,
+        }
+
+    @staticmethod
+    def _serialize(response_data, want_geojson):
+        """
+        Serialize a payload to JSON bytes with orjson, skipping DRF's
+        content negotiation and Python-level encoding. GeoJSON is attached
+        only on request, spliced in as pre-serialized bytes.
+        """
+        if want_geojson:
+            response_data['route']['geojson'] = orjson.Fragment(
+                polyline_to_geojson_bytes(response_data['route']['polyline'])
+            )
+        return orjson.dumps(response_data, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    @staticmethod
+    def _etag(blob):
+        """Opaque validator for a cached compressed body"""
+        return f'"{hashlib.blake2b(blob, digest_size=8).hexdigest()}"'
+
+    @staticmethod
+    def _if_none_match_hit(request, etag):
+        """
+        Whether the request's If-None-Match matches our validator. The
+        header may carry a comma-separated list, weak validators (W/"...")
+        and '*'; weak comparison suffices here since a 304 never has a body.
+        """
+        header = request.headers.get('If-None-Match')
+        if not header:
+            return False
+        for candidate in header.split(','):
+            candidate = candidate.strip()
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            if candidate == etag or candidate == '*':
+                return True
+        return False
+
+    @staticmethod
+    def _accepts_zstd(request):
+        """
+        Whether the client's Accept-Encoding admits zstd. A plain substring
+        test would also match an explicit refusal like 'zstd;q=0', so the
+        header is split into codings and the q-value checked.
+        """
+        for token in request.headers.get('Accept-Encoding', '').split(','):
+            coding, _, params = token.partition(';')
+            if coding.strip().lower() != 'zstd':
+                continue
+            params = params.strip().lower()
+            if params.startswith('q='):
+                try:
+                    return float(params[2:]) > 0
+                except ValueError:
+                    return False
+            return True
+        return False
+
+    @classmethod
+    def _blob_response(cls, blob, request):
+        """
+        Serve a cached zstd-compressed body. A matching If-None-Match gets
+        an empty 304 before any decompression; clients advertising zstd get
+        the compressed bytes as-is; everyone else pays one decompress -
+        either way the cache hit path never re-serializes JSON.
+        """
+        etag = cls._etag(blob)
+        if cls._if_none_match_hit(request, etag):
+            # RFC 9110: the 304 carries the validator it matched
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        if cls._accepts_zstd(request):
+            response = HttpResponse(blob, content_type='application/json')
+            response['Content-Encoding'] = 'zstd'
+        else:
+            response = HttpResponse(
+                zstandard.ZstdDecompressor().decompress(blob),
+                content_type='application/json'
+            )
+        response['ETag'] = etag
+        # The body encoding depends on the request header; without Vary a
+        # shared cache could hand the zstd bytes to a client that cannot
+        # decode them
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
     def post(self, request):
         """
         Plan a route with optimal fuel stops
         """
-        # Validate input using serializer
-        serializer = RouteRequestSerializer(data=request.data)
-        if not serializer.is_valid():
+        # Validate input
+        start, finish, errors = _validate_route_request(request.data)
+        if errors:
             return Response(
-                {'error': 'Invalid input data', 'details': serializer.errors}, 
+                {'error': 'Invalid input data', 'details': errors},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        # Normalize for hashing so "Chicago, IL" and "chicago,IL " share a
+        # cache entry; the raw values still flow to logs and the response
+        norm_start = " ".join(start.strip().casefold().split())
+        norm_finish = " ".join(finish.strip().casefold().split())
+
+        # Create cache key: BLAKE2b is faster than MD5 and collision-safe;
+        # the \x1f separator prevents ("ab","c") / ("a","bc") aliasing
+        digest = hashlib.blake2b(f"{norm_start}\x1f{norm_finish}".encode(), digest_size=16).digest()
+        cache_key = f"route_plan:{base64.urlsafe_b64encode(digest).rstrip(b'=').decode()}"
         
-        start = serializer.validated_data['start']
-        finish = serializer.validated_data['finish']
-        
-        # Create cache key
-        cache_key = f"route_plan:{hashlib.md5(f'{start}:{finish}'.encode()).hexdigest()}"
-        
-        # Check cache first
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.info(f"Returning cached result for route {start} -> {finish}")
-            return Response(cached_result)
-        
+        # GeoJSON expansion is opt-in; default responses carry the compact
+        # encoded polyline and let the client decode
+        want_geojson = request.query_params.get('format') == 'geojson'
+
+        # The two formats serialize differently, so each gets its own
+        # variant of the cache entry: ready-to-send zstd-compressed bytes
+        key_suffix = ':gj' if want_geojson else ''
+        variant_key = cache_key + key_suffix
+
+        # Check the in-process tier first (no network roundtrip); the Redis
+        # keys are probed inside _plan in one batched get_many
+        with _local_cache_lock:
+            cached_blob = _local_cache.get(variant_key)
+        if cached_blob:
+            # Hottest path in the view: log lazily (no f-string work unless
+            # the record is emitted) and only at DEBUG - at INFO volume this
+            # line would dominate what the handler writes
+            logger.debug("Returning locally cached result for route %s -> %s", start, finish)
+            return self._blob_response(cached_blob, request)
+
         try:
-            # Initialize services
-            routing_service = RoutePlanningService()
-            fuel_service = HybridFuelOptimizationService()
-            
-            # Plan the route
-            route_data = routing_service.plan_route_sync(start, finish)
-            
-            if not route_data:
-                logger.warning(f"Could not plan route from {start} to {finish}")
+            # Shared service singletons
+            routing_service, fuel_service = _get_services()
+
+            # Run the I/O-bound legs concurrently on the shared loop, so
+            # the services' pooled connections outlive this request
+            plan = asyncio.run_coroutine_threadsafe(
+                self._plan(routing_service, fuel_service, start, finish,
+                           variant_key, key_suffix),
+                _get_plan_loop()
+            ).result()
+
+            if plan.get('cached') is not None:
+                cached_blob = plan['cached']
+                logger.info("Returning cached result for route %s -> %s", start, finish)
+                if not plan['from_text']:
+                    # Coord-key hit: copy the entry under the text key so
+                    # the next request with this wording skips geocoding
+                    cache.set(variant_key, cached_blob, settings.CACHE_TTL)
+                with _local_cache_lock:
+                    _local_cache[variant_key] = cached_blob
+                return self._blob_response(cached_blob, request)
+
+            if not plan.get('route'):
+                logger.warning("Could not plan route from %s to %s", start, finish)
                 return Response(
-                    {'error': 'Could not plan route between the specified locations'}, 
+                    {'error': 'Could not plan route between the specified locations'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            # Extract route information
-            start_coords = route_data['start_coords']
-            end_coords = route_data['end_coords']
-            route = route_data['route']
-            
-            # Convert route geometry to points for fuel optimization
-            # For now, we'll use start and end points and interpolate
-            # In a real implementation, you'd decode the polyline
-            route_points = [start_coords, end_coords]
-            
-            # Get states along the route (simplified - in reality you'd parse the route)
-            # For now, we'll get stations in all states
-            states = None
-            
-            # Optimize fuel stops
-            fuel_optimization = fuel_service.find_optimal_fuel_stops(
-                start_coords, end_coords
-            )
-            
-            # Prepare fuel stops for response
+
+            start_coords = plan['start_coords']
+            end_coords = plan['end_coords']
+            route = plan['route']
+            coord_key = plan['coord_key']
+            fuel_optimization = plan['fuel_optimization']
+
+            # Prepare fuel stops for response. Station is a namedtuple, so
+            # one tuple unpack replaces seven attribute lookups per stop,
+            # and retail_price is already a float - no per-stop conversion
             fuel_stops_response = []
+            append_stop = fuel_stops_response.append
             for stop in fuel_optimization['fuel_stops']:
-                station = stop['station']
-                fuel_stops_response.append({
-                    'name': station.name,
-                    'address': station.address,
-                    'city': station.city,
-                    'state': station.state,
+                name, address, city, state, lat, lon, price = stop['station']
+                append_stop({
+                    'name': name,
+                    'address': address,
+                    'city': city,
+                    'state': state,
                     'coordinates': {
-                        'lat': station.latitude,
-                        'lon': station.longitude
+                        # 5 decimals ~ 1.1 m, below routing accuracy;
+                        # shorter floats serialize and gzip smaller
+                        'lat': round(lat, 5),
+                        'lon': round(lon, 5)
                     },
-                    'price_per_gallon': float(station.retail_price),
-                            'distance_from_prev_miles': round(stop['distance_from_previous'], 2),
+                    'price_per_gallon': price,
+                    'distance_from_prev_miles': round(stop['distance_from_previous'], 2),
                     'fuel_needed_gallons': round(stop['fuel_needed'], 2),
                     'cost': round(stop['cost'], 2)
                 })
@@ -104,15 +355,15 @@ class RoutePlanView(APIView):
                     'start': {
                         'location': start,
                         'coordinates': {
-                            'lat': start_coords[0],
-                            'lon': start_coords[1]
+                            'lat': round(start_coords[0], 5),
+                            'lon': round(start_coords[1], 5)
                         }
                     },
                     'finish': {
                         'location': finish,
                         'coordinates': {
-                            'lat': end_coords[0],
-                            'lon': end_coords[1]
+                            'lat': round(end_coords[0], 5),
+                            'lon': round(end_coords[1], 5)
                         }
                     },
                     'total_distance_miles': round(route['distance'] / 1609.34, 2),  # Convert meters to miles
@@ -124,24 +375,56 @@ class RoutePlanView(APIView):
                     'number_of_stops': fuel_optimization['summary']['number_of_stops']
                 },
                 'route': {
-                    'geojson': polyline_to_geojson(route['geometry']),
+                    'polyline': route['geometry'],
+                    'encoding': 'polyline5',
                     'distance_meters': route['distance'],
                     'duration_seconds': route['duration']
                 },
                 'fuel_stops': fuel_stops_response
             }
+
+            # Serialize once, then cache the compressed bytes under both the
+            # text key and the coord key: cache hits skip pickling, JSON
+            # encoding and most of the Redis transfer, and the blob can go
+            # out Content-Encoding: zstd without touching it
+            body = self._serialize(response_data, want_geojson)
+            blob = zstandard.ZstdCompressor(level=3).compress(body)
+            cache.set_many(
+                {variant_key: blob, coord_key: blob},
+                settings.CACHE_TTL
+            )
+            with _local_cache_lock:
+                _local_cache[variant_key] = blob
+            logger.info("Successfully planned route from %s to %s", start, finish)
+
+            response = HttpResponse(body, content_type='application/json')
+            # Same validator the cached paths derive from the blob, so the
+            # client's very next revalidation can already 304
+            response['ETag'] = self._etag(blob)
+            return response
             
-            # Response data is ready - no need for validation since we control the format
-            
-            # Cache the result
-            cache.set(cache_key, response_data, settings.CACHE_TTL)
-            logger.info(f"Successfully planned route from {start} to {finish}")
-            
-            return Response(response_data)
-            
-        except Exception as e:
-            logger.error(f"Error planning route from {start} to {finish}", exc_info=True)
+        except httpx.HTTPError as e:
+            # Downstream (OSRM/Nominatim) flakiness after the services'
+            # own retries: an expected, transient condition - log cheaply
+            # without a traceback and tell the client when to come back
+            logger.warning("Upstream error planning route from %s to %s: %s", start, finish, e)
+            return Response(
+                {'error': 'Routing backend temporarily unavailable'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '5'}
+            )
+        except (KeyError, ValueError) as e:
+            # Malformed payloads from a backend (missing route fields,
+            # unparseable coordinates) - the request can't succeed as given
+            logger.warning("Bad routing data for route from %s to %s: %s", start, finish, e)
+            return Response(
+                {'error': 'Could not plan route between the specified locations'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception:
+            # Genuinely unexpected: pay for the traceback here only
+            logger.error("Error planning route from %s to %s", start, finish, exc_info=True)
             return Response(
-                {'error': 'Internal server error'}, 
+                {'error': 'Internal server error'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
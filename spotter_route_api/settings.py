@@ -156,7 +156,12 @@ CORS_ALLOW_ALL_ORIGINS = True  # Configure appropriately for production
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'planner.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'planner.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
@@ -167,11 +172,18 @@ OSRM_BASE_URL = 'http://router.project-osrm.org'
 NOMINATIM_BASE_URL = 'https://nominatim.openstreetmap.org'
 NOMINATIM_USER_AGENT = 'SpotterRouteAPI/1.0'
 
+# Persistent geocoding cache (survives restarts, unlike Redis/LocMem)
+GEOCODE_CACHE_DIR = str(BASE_DIR / '.geocode_cache')
+
 # Route Planning Configuration
 VEHICLE_MPG = 10  # miles per gallon
 VEHICLE_MAX_RANGE = 500  # miles
 CACHE_TTL = 3600  # 1 hour in seconds
 
+# Douglas-Peucker tolerance (degrees) for GeoJSON route geometry;
+# ~11 m, far below rendering accuracy. Set to 0 to disable.
+ROUTE_SIMPLIFY_TOLERANCE = 0.0001
+
 # GDAL Configuration for Docker
 import os
 if os.path.exists('/usr/lib/x86_64-linux-gnu/libgdal.so'):